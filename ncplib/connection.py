@@ -413,10 +413,11 @@ class Connection(AsyncIteratorMixin):
             # Return buffered fields.
             if self._field_buffer:
                 field = self._field_buffer.pop()
-                self.logger.debug(
-                    "Received field %s %s from %s over NCP",
-                    field.packet_type, field.name, self.remote_hostname
-                )
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(
+                        "Received field %s %s from %s over NCP",
+                        field.packet_type, field.name, self.remote_hostname
+                    )
                 if self._predicate(field):  # type: ignore
                     return field
             packet_type, packet_id, packet_timestamp, packet_info, fields = await _wait_for(
@@ -453,8 +454,10 @@ class Connection(AsyncIteratorMixin):
         self._writer.write(encoded_packet)
         self.logger.debug("Sent packet %s to %s over NCP", packet_type, self.remote_hostname)
         expected_fields = set()
+        debug = self.logger.isEnabledFor(logging.DEBUG)
         for field_name, field_id, params in fields:
-            self.logger.debug("Sent field %s %s to %s over NCP", packet_type, field_name, self.remote_hostname)
+            if debug:
+                self.logger.debug("Sent field %s %s to %s over NCP", packet_type, field_name, self.remote_hostname)
             expected_fields.add((field_name, field_id))
         # If the connection supports CCRE LINK, we can defer the LINK send.
         if self._remote_timeout > 0 and self._link_send_handle is not None:
@@ -1,8 +1,9 @@
 from __future__ import annotations
 from array import array
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from struct import Struct
-from typing import Callable, Iterable, List, Tuple, Union
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 import warnings
 from ncplib.errors import DecodeError, DecodeWarning
 from ncplib.values import u32, i64, u64, f64
@@ -16,10 +17,18 @@ FIELD_HEADER_STRUCT = Struct("<4s3s1sI")
 
 PARAM_HEADER_STRUCT = Struct("<4s3sB")
 
+VALUE_I32_STRUCT = Struct("<i")
+
 VALUE_F32_STRUCT = Struct("<f")
 
 VALUE_F64_STRUCT = Struct("<d")
 
+# Decoding structs read the u24 size and the u8 type ID that follows it as a single u32.
+
+FIELD_HEADER_DECODE_STRUCT = Struct("<4sII")
+
+PARAM_HEADER_DECODE_STRUCT = Struct("<4sI")
+
 
 # Sizes.
 
@@ -42,6 +51,14 @@ PACKET_FOOTER = b"\xaa\xbb\xcc\xdd"
 
 PACKET_FOOTER_NO_CHECKSUM = b"\x00\x00\x00\x00" + PACKET_FOOTER
 
+# Param padding, indexed by the number of padding bytes needed.
+PADDING = (b"", b"\x00", b"\x00\x00", b"\x00\x00\x00")
+
+
+# Timestamps.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 # Known type codes.
 
@@ -106,34 +123,19 @@ Packet = Tuple[str, int, datetime, bytes, Fields]
 
 
 def encode_packet(packet_type: str, packet_id: int, timestamp: datetime, info: bytes, fields: Fields) -> bytes:
-    timestamp = timestamp.astimezone(timezone.utc)
-    # Encode the header.
-    packet_header = bytearray(PACKET_HEADER_SIZE)
-    PACKET_HEADER_STRUCT.pack_into(
-        packet_header, 0,
-        PACKET_HEADER,  # Hardcoded packet header.
-        packet_type.encode(),
-        0,  # Placeholder for the packet size, which we will calculate soon.
-        packet_id,
-        PACKET_VERSION,
-        int(timestamp.timestamp()), timestamp.microsecond * 1000,
-        info,
-    )
-    chunks: List[Bytes] = [packet_header]
+    # Naive timestamps are treated as local time.
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    timestamp_delta = timestamp - EPOCH
+    # The packet header is written last, once the packet size is known.
+    chunks: List[Bytes] = [b""]
     offset = PACKET_HEADER_SIZE
     # Write the packet fields.
     for field_name, field_id, params in fields:
         field_offset = offset
-        # Write the field header.
-        field_header = bytearray(FIELD_HEADER_SIZE)
-        FIELD_HEADER_STRUCT.pack_into(
-            field_header, 0,
-            field_name.encode(),
-            b"\x00\x00\x00",  # Placeholder for the field size, which we will calculate soom.
-            b"\x00",  # Field type ID is ignored.
-            field_id,
-        )
-        chunks.append(field_header)
+        # The field header is written once the field size is known.
+        field_header_index = len(chunks)
+        chunks.append(b"")
         offset += FIELD_HEADER_SIZE
         # Write the params.
         for param_name, param_value in params:
@@ -176,21 +178,88 @@ def encode_packet(packet_type: str, packet_id: int, timestamp: datetime, info: b
             ))
             # Write the param value.
             chunks.append(param_value)  # type: ignore
-            chunks.append(b"\x00" * param_padding_size)
+            if param_padding_size:
+                chunks.append(PADDING[param_padding_size])
             offset += param_size + param_padding_size
-        # Write the field size.
-        field_header[4:7] = ((offset - field_offset) // 4).to_bytes(3, "little")[:3]
+        # Write the field header.
+        chunks[field_header_index] = FIELD_HEADER_STRUCT.pack(
+            field_name.encode(),
+            ((offset - field_offset) // 4).to_bytes(3, "little"),
+            b"\x00",  # Field type ID is ignored.
+            field_id,
+        )
     # Encode the packet footer.
     chunks.append(PACKET_FOOTER_NO_CHECKSUM)
-    # Write the packet size.
-    packet_header[8:12] = ((offset + PACKET_FOOTER_SIZE) // 4).to_bytes(4, "little")
+    # Write the packet header.
+    chunks[0] = PACKET_HEADER_STRUCT.pack(
+        PACKET_HEADER,  # Hardcoded packet header.
+        packet_type.encode(),
+        (offset + PACKET_FOOTER_SIZE) // 4,
+        packet_id,
+        PACKET_VERSION,
+        timestamp_delta.days * 86400 + timestamp_delta.seconds, timestamp_delta.microseconds * 1000,
+        info,
+    )
     # All done!
     return b"".join(chunks)
 
 
 # PacketData decoding.
 
-def decode_packet_cps(header_buf: Bytes) -> Tuple[int, Callable[[Bytes], Packet]]:
+def decode_string(value: Bytes) -> str:
+    # Strings are null-terminated, then padded to the param size.
+    null_index = value.find(b"\x00")
+    if null_index != -1:
+        value = value[:null_index]
+    try:
+        return value.decode()
+    except UnicodeDecodeError as ex:  # pragma: no cover
+        raise DecodeError(ex) from ex
+
+
+PARAM_VALUE_DECODERS: Dict[int, Callable[[Bytes], Param]] = {
+    TYPE_I32: lambda value: int.from_bytes(value, "little", signed=True),
+    TYPE_U32: lambda value: u32.from_bytes(value, "little"),
+    TYPE_STRING: decode_string,
+    TYPE_I64: lambda value: i64.from_bytes(value, "little", signed=True),
+    TYPE_U64: lambda value: u64.from_bytes(value, "little"),
+    TYPE_F32: lambda value: VALUE_F32_STRUCT.unpack(value)[0],
+    TYPE_F64: lambda value: f64(VALUE_F64_STRUCT.unpack(value)[0]),
+    TYPE_RAW: bytes,
+    TYPE_ARRAY_U8: partial(array, "B"),
+    TYPE_ARRAY_U16: partial(array, "H"),
+    TYPE_ARRAY_U32: partial(array, "I"),
+    TYPE_ARRAY_I8: partial(array, "b"),
+    TYPE_ARRAY_I16: partial(array, "h"),
+    TYPE_ARRAY_I32: partial(array, "i"),
+    TYPE_ARRAY_U64: partial(array, "L"),
+    TYPE_ARRAY_I64: partial(array, "l"),
+    TYPE_ARRAY_F32: partial(array, "f"),
+    TYPE_ARRAY_F64: partial(array, "d"),
+}
+
+# Decoders indexed directly by the u8 type ID, with None for unsupported types.
+PARAM_VALUE_DECODERS_BY_TYPE_ID: Tuple[Optional[Callable[[Bytes], Param]], ...] = tuple(
+    PARAM_VALUE_DECODERS.get(type_id) for type_id in range(256)
+)
+
+
+# Identifiers are drawn from a small set of names, so decoded identifiers are cached up to a size limit.
+IDENTIFIER_CACHE: Dict[bytes, str] = {}
+
+IDENTIFIER_CACHE_SIZE = 2048
+
+
+def decode_identifier(value: bytes) -> str:
+    identifier = IDENTIFIER_CACHE.get(value)
+    if identifier is None:
+        identifier = value.rstrip(b" \x00").decode("latin1")
+        if len(IDENTIFIER_CACHE) < IDENTIFIER_CACHE_SIZE:
+            IDENTIFIER_CACHE[value] = identifier
+    return identifier
+
+
+def decode_packet_cps(header_buf: Bytes, body_offset: int = 0) -> Tuple[int, Callable[[Bytes], Packet]]:
     (
         packet_header,
         packet_type,
@@ -200,7 +269,7 @@ def decode_packet_cps(header_buf: Bytes) -> Tuple[int, Callable[[Bytes], Packet]
         packet_time,
         packet_nanotime,
         packet_info,
-    ) = PACKET_HEADER_STRUCT.unpack(header_buf)
+    ) = PACKET_HEADER_STRUCT.unpack_from(header_buf, 0)
     packet_size = packet_size * 4
     if packet_header != PACKET_HEADER:  # pragma: no cover
         raise DecodeError(f"Invalid packet header {packet_header!r}")
@@ -208,84 +277,64 @@ def decode_packet_cps(header_buf: Bytes) -> Tuple[int, Callable[[Bytes], Packet]
     size_remaining = packet_size - PACKET_HEADER_SIZE
 
     def decode_packet_body(buf: Bytes) -> Packet:
-        offset = 0
+        field_header_unpack_from = FIELD_HEADER_DECODE_STRUCT.unpack_from
+        param_header_unpack_from = PARAM_HEADER_DECODE_STRUCT.unpack_from
+        param_value_decoders = PARAM_VALUE_DECODERS_BY_TYPE_ID
+        identifier_cache_get = IDENTIFIER_CACHE.get
+        value_i32_unpack_from = VALUE_I32_STRUCT.unpack_from
+        offset = body_offset
         # Check footer.
-        if buf[-4:] != PACKET_FOOTER:  # pragma: no cover
+        if not buf.endswith(PACKET_FOOTER):  # pragma: no cover
             raise DecodeError(f"Invalid packet footer {buf[-4:]!r}")
         # Decode fields.
-        field_limit = size_remaining - PACKET_FOOTER_SIZE
+        field_limit = body_offset + size_remaining - PACKET_FOOTER_SIZE
         fields = []
         while offset < field_limit:
             # Decode field header.
-            field_name, field_size, field_type_id, field_id = FIELD_HEADER_STRUCT.unpack_from(buf, offset)
-            param_limit = offset + int.from_bytes(field_size, "little") * 4
+            field_name, field_size_type, field_id = field_header_unpack_from(buf, offset)
+            param_limit = offset + (field_size_type & 0xFFFFFF) * 4
             offset += FIELD_HEADER_SIZE
             # Decode params.
             params = []
             while offset < param_limit:
                 # Decode the param header.
-                param_name, param_size, param_type_id = PARAM_HEADER_STRUCT.unpack_from(buf, offset)
-                param_size = int.from_bytes(param_size, "little") * 4
-                # Decode the param value.
-                param_value_raw = buf[offset+PARAM_HEADER_SIZE:offset+param_size]
+                param_name, param_size_type = param_header_unpack_from(buf, offset)
+                param_size = (param_size_type & 0xFFFFFF) * 4
+                param_type_id = param_size_type >> 24
+                # Decode the param value. The common, well-formed i32 case is read in place, without slicing.
                 param_value: Param
-                if param_type_id == TYPE_I32:
-                    param_value = int.from_bytes(param_value_raw, "little", signed=True)
-                elif param_type_id == TYPE_U32:
-                    param_value = u32.from_bytes(param_value_raw, "little")
-                elif param_type_id == TYPE_STRING:
-                    try:
-                        param_value = param_value_raw.split(b"\x00", 1)[0].decode()
-                    except UnicodeDecodeError as ex:  # pragma: no cover
-                        raise DecodeError(ex) from ex
-                elif param_type_id == TYPE_I64:
-                    param_value = i64.from_bytes(param_value_raw, "little", signed=True)
-                elif param_type_id == TYPE_U64:
-                    param_value = u64.from_bytes(param_value_raw, "little")
-                elif param_type_id == TYPE_F32:
-                    param_value = VALUE_F32_STRUCT.unpack(param_value_raw)[0]
-                elif param_type_id == TYPE_F64:
-                    param_value = f64(VALUE_F64_STRUCT.unpack(param_value_raw)[0])
-                elif param_type_id == TYPE_RAW:
-                    param_value = bytes(param_value_raw)
-                elif param_type_id == TYPE_ARRAY_U8:
-                    param_value = array("B", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_U16:
-                    param_value = array("H", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_U32:
-                    param_value = array("I", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_I8:
-                    param_value = array("b", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_I16:
-                    param_value = array("h", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_I32:
-                    param_value = array("i", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_U64:
-                    param_value = array("L", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_I64:
-                    param_value = array("l", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_F32:
-                    param_value = array("f", param_value_raw)
-                elif param_type_id == TYPE_ARRAY_F64:
-                    param_value = array("d", param_value_raw)
-                else:  # pragma: no cover
-                    warnings.warn(DecodeWarning("Unsupported type ID", param_type_id))
+                if param_type_id == TYPE_I32 and param_size == PARAM_HEADER_SIZE + 4:
+                    param_value = value_i32_unpack_from(buf, offset + PARAM_HEADER_SIZE)[0]
+                else:
+                    param_value_decoder = param_value_decoders[param_type_id]
+                    if param_value_decoder is not None:
+                        param_value = param_value_decoder(buf[offset+PARAM_HEADER_SIZE:offset+param_size])
+                    # HACK: Axis nodes sometimes embed a packet footer inside a field. This reads as an unsupported
+                    # type ID, so is only checked for on that path.
+                    elif buf[offset:offset+PACKET_FOOTER_SIZE] == PACKET_FOOTER_NO_CHECKSUM:
+                        warnings.warn(DecodeWarning("Encountered embedded packet footer bug"))
+                        offset += PACKET_FOOTER_SIZE
+                        continue
+                    else:
+                        warnings.warn(DecodeWarning("Unsupported type ID", param_type_id))
+                        param_value = bytes(buf[offset+PARAM_HEADER_SIZE:offset+param_size])
                 # Store the param.
-                params.append((param_name.rstrip(b" \x00").decode("latin1"), param_value))
+                params.append((identifier_cache_get(param_name) or decode_identifier(param_name), param_value))
                 offset += param_size
-                # Check for param overflow.
-                if offset > param_limit:  # pragma: no cover
-                    raise DecodeError(f"Parameter overflow by {offset - param_limit} bytes")
+            # Check for param overflow. The loop exits as soon as the limit is reached, so this catches an overflow from
+            # any param, including a skipped embedded footer.
+            if offset > param_limit:
+                raise DecodeError(f"Parameter overflow by {offset - param_limit} bytes")
             # Store the field.
-            fields.append((field_name.rstrip(b" \x00").decode("latin1"), field_id, params))
+            fields.append((identifier_cache_get(field_name) or decode_identifier(field_name), field_id, params))
         # Check for field overflow.
         if offset > field_limit:  # pragma: no cover
             raise DecodeError(f"Field overflow by {offset - field_limit} bytes")
         # All done!
         return (
-            packet_type.rstrip(b" \x00").decode("latin1"),
+            decode_identifier(packet_type),
             packet_id,
-            datetime.fromtimestamp(packet_time, tz=timezone.utc).replace(microsecond=packet_nanotime // 1000),
+            EPOCH + timedelta(seconds=packet_time, microseconds=packet_nanotime // 1000),
             packet_info,
             fields,
         )
@@ -295,5 +344,27 @@ def decode_packet_cps(header_buf: Bytes) -> Tuple[int, Callable[[Bytes], Packet]
 
 
 def decode_packet(buf: Bytes) -> Packet:
-    body_size, decode_packet_body = decode_packet_cps(buf[:PACKET_HEADER_SIZE])
-    return decode_packet_body(buf[PACKET_HEADER_SIZE:])  # 32 is the size of the packet header.
+    # Decode the body in place, after the packet header, rather than slicing it out.
+    body_size, decode_packet_body = decode_packet_cps(buf, PACKET_HEADER_SIZE)
+    return decode_packet_body(buf)
+
+
+def decode_packets_batch(bufs: Iterable[Bytes]) -> Dict[Tuple[str, int, str], List[Optional[Param]]]:
+    # Decode the packets into per-param columns, keyed by (field name, field ID, param name). Every column has one
+    # row per packet, with None for packets that did not contain the param.
+    columns: Dict[Tuple[str, int, str], List[Optional[Param]]] = {}
+    packet_count = 0
+    for buf in bufs:
+        row = {
+            (field_name, field_id, param_name): param_value
+            for field_name, field_id, params in decode_packet(buf)[4]
+            for param_name, param_value in params
+        }
+        for key, param_value in row.items():
+            column = columns.setdefault(key, [])
+            column.extend([None] * (packet_count - len(column)))
+            column.append(param_value)
+        packet_count += 1
+    for column in columns.values():
+        column.extend([None] * (packet_count - len(column)))
+    return columns
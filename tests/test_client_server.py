@@ -115,6 +115,14 @@ class ClientServerTestCase(AsyncTestCase):
         response = client.send("LINK", "ECHO", FOO="BAR")
         await self.assertMessages(response, "LINK", {"ECHO": {"FOO": "BAR"}})
 
+    async def testSendDebugLogging(self) -> None:
+        client = await self.createClient()
+        with self.assertLogs("ncplib.client", "DEBUG") as cx:
+            response = client.send("LINK", "ECHO", FOO="BAR")
+            await self.assertMessages(response, "LINK", {"ECHO": {"FOO": "BAR"}})
+        self.assertTrue(any("Sent field LINK ECHO to" in line for line in cx.output))
+        self.assertTrue(any("Received field LINK ECHO from" in line for line in cx.output))
+
     async def testSendFiltersMessages(self) -> None:
         client = await self.createClient()
         client.send("JUNK", "JUNK", JUNK="JUNK")
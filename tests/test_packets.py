@@ -1,11 +1,11 @@
 from __future__ import annotations
 import unittest
 from array import array
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from math import inf
 from typing import Sequence, Tuple
-from ncplib.packets import Param, encode_packet, decode_packet
-from ncplib import u32, i64, u64, f64
+from ncplib.packets import PACKET_FOOTER_NO_CHECKSUM, Param, encode_packet, decode_packet, decode_packets_batch
+from ncplib import u32, i64, u64, f64, DecodeError, DecodeWarning
 
 
 REAL_PACKET = (
@@ -132,6 +132,41 @@ class PacketDatasTestCase(unittest.TestCase):
             ]),
         ])
 
+    def testDecodeRealPacketDataEmbeddedFooterBug(self) -> None:
+        with self.assertWarns(DecodeWarning):
+            decoded_packet = decode_packet(REAL_PACKET_EMBEDDED_FOOTER_BUG)
+        decoded_fields = list(decoded_packet[4])
+        self.assertEqual(decoded_fields[0], ("STAT", 1, [
+            ("OCON", 3),
+            ("CADD", "127.0.0.1,127.0.0.1,192.168.1.28"),
+            ("CIDS", "rfeye000709,rfeye000709,python3-ncplib"),
+            ("RGPS", "no GPS,no GPS,no GPS"),
+            ("ELOC", 0),
+        ]))
+        self.assertEqual(decoded_fields[1], ("SGPS", 1, [
+            ("LATI", 51180800),
+            ("LONG", -100000),
+            ("STAT", 1),
+            ("GFIX", 1),
+            ("SATS", 9),
+            ("SPEE", 20372),
+            ("HEAD", 4256),
+            ("ALTI", 9000),
+            ("UTIM", 1441030068),
+            ("TSTR", "Mon Aug 31 14:07:48 2015"),
+        ]))
+
+    def testDecodeEmbeddedFooterBugOverflow(self) -> None:
+        packet_timestamp = datetime.now(tz=timezone.utc)
+        encoded_packet = bytearray(encode_packet("PACK", 10, packet_timestamp, b"INFO", [
+            ("FIEL", 20, [("PARA", 1), ("PADD", b"")]),
+        ]))
+        # Replace the last param with an embedded footer, and shrink the field so the footer straddles its end.
+        encoded_packet[56:64] = PACKET_FOOTER_NO_CHECKSUM
+        encoded_packet[36] -= 1
+        with self.assertWarns(DecodeWarning), self.assertRaises(DecodeError):
+            decode_packet(bytes(encoded_packet))
+
     def testEncodeDecodeValue(self) -> None:
         packet_timestamp = datetime.now(tz=timezone.utc)
         for value, expected_value in PACKET_VALUES:
@@ -148,3 +183,53 @@ class PacketDatasTestCase(unittest.TestCase):
                 self.assertIs(decoded_type, expected_value.__class__)
                 if decoded_type is array:
                     self.assertEqual(value.typecode, decoded_value.typecode)  # type: ignore
+
+    def testDecodeUnsupportedTypeID(self) -> None:
+        packet_timestamp = datetime.now(tz=timezone.utc)
+        encoded_packet = bytearray(encode_packet("PACK", 10, packet_timestamp, b"INFO", [
+            ("FIEL", 20, [("PARA", b"foo")]),
+        ]))
+        encoded_packet[51] = 0x7F  # Patch the param type ID to an unsupported value.
+        with self.assertWarns(DecodeWarning):
+            decoded_packet = decode_packet(bytes(encoded_packet))
+        self.assertEqual(decoded_packet[4], [("FIEL", 20, [("PARA", b"foo\x00")])])
+
+    def testDecodeMalformedI32Size(self) -> None:
+        packet_timestamp = datetime.now(tz=timezone.utc)
+        for raw_value, expected_value in ((b"", 0), ((2 ** 32 + 1).to_bytes(8, "little"), 2 ** 32 + 1)):
+            with self.subTest(raw_value=raw_value):
+                encoded_packet = bytearray(encode_packet("PACK", 10, packet_timestamp, b"INFO", [
+                    ("FIEL", 20, [("PARA", raw_value), ("NEXT", 1)]),
+                ]))
+                encoded_packet[51] = 0x00  # Patch the raw param type ID to i32.
+                self.assertEqual(decode_packet(bytes(encoded_packet))[4], [
+                    ("FIEL", 20, [("PARA", expected_value), ("NEXT", 1)]),
+                ])
+
+    def testDecodePacketsBatch(self) -> None:
+        packet_timestamp = datetime.now(tz=timezone.utc)
+        encoded_packets = [
+            encode_packet("PACK", 1, packet_timestamp, b"INFO", [
+                ("FIEL", 1, [("A", 1), ("B", 10), ("DATA", array("H", [1]))]),
+            ]),
+            encode_packet("PACK", 2, packet_timestamp, b"INFO", [
+                ("FIEL", 1, [("A", 2), ("DATA", array("H", [2, 2]))]),
+            ]),
+            encode_packet("PACK", 3, packet_timestamp, b"INFO", [
+                ("FIEL", 1, [("A", 3), ("B", 30)]),
+                ("FIEL", 2, [("B", 31)]),
+            ]),
+        ]
+        self.assertEqual(decode_packets_batch(encoded_packets), {
+            ("FIEL", 1, "A"): [1, 2, 3],
+            ("FIEL", 1, "B"): [10, None, 30],
+            ("FIEL", 1, "DATA"): [array("H", [1, 0]), array("H", [2, 2]), None],
+            ("FIEL", 2, "B"): [None, None, 31],
+        })
+
+    def testEncodeDecodeTimestamp(self) -> None:
+        packet_timestamp = datetime.now(tz=timezone(timedelta(hours=5)))
+        for timestamp in (packet_timestamp, packet_timestamp.astimezone().replace(tzinfo=None)):
+            with self.subTest(timestamp=timestamp):
+                decoded_packet = decode_packet(encode_packet("PACK", 10, timestamp, b"INFO", []))
+                self.assertEqual(decoded_packet[2], packet_timestamp)